@@ -0,0 +1,57 @@
+"""Create orders table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+
+Databases created by the old startup-time create_all() already have the
+orders table; for those only the missing indexes are added.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_orders_id', ['id'], False),
+    ('ix_orders_order_id', ['order_id'], True),
+    ('ix_orders_customer_email', ['customer_email'], False),
+    ('ix_orders_status', ['status'], False),
+    ('ix_orders_order_date', ['order_date'], False),
+    ('idx_order_date_status', ['order_date', 'status'], False),
+    ('idx_customer_email_order_date', ['customer_email', 'order_date'], False),
+    ('idx_order_date_id', ['order_date', 'id'], False),
+)
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    
+    if not inspector.has_table('orders'):
+        op.create_table(
+            'orders',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('order_id', sa.String(50), nullable=False),
+            sa.Column('customer_email', sa.String(255), nullable=False),
+            sa.Column('customer_name', sa.String(100), nullable=False),
+            sa.Column('product_name', sa.String(500), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('unit_price', sa.Float(), nullable=False),
+            sa.Column('total_amount', sa.Float(), nullable=False),
+            sa.Column('status', sa.String(50), nullable=False),
+            sa.Column('order_date', sa.DateTime(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+        )
+        existing = set()
+    else:
+        existing = {index['name'] for index in inspector.get_indexes('orders')}
+    
+    for name, columns, unique in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'orders', columns, unique=unique)
+
+def downgrade():
+    op.drop_table('orders')
@@ -1,8 +1,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta, timezone
-import jwt
+try:
+    # Rust-backed HS256 implementation with a PyJWT-compatible API
+    import jwt_rs as jwt
+except ImportError:
+    import jwt
 from typing import Optional
+import hashlib
+import hmac
+import threading
+import time
 import os
 import sys
 
@@ -18,10 +26,33 @@ if len(SECRET_KEY) < 32:
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour
+MAX_TOKEN_LENGTH = 4096  # Longer bearer tokens are rejected without decoding
 
 # Security scheme
 security = HTTPBearer()
 
+# Verified token cache: sha256(token) -> (user payload, exp timestamp)
+# Avoids re-running jwt.decode for the same token on every request
+TOKEN_CACHE_MAX_SIZE = 10_000
+_token_cache: dict[bytes, tuple[dict, float]] = {}
+_token_cache_lock = threading.Lock()
+
+# Role permission bits, assigned once at import time
+ROLE_BITS = {
+    "admin": 1,
+    "viewer": 2,
+}
+
+# Effective mask per role with inheritance folded in (admin implies viewer)
+ROLE_INHERITS = {
+    "admin": ("viewer",),
+    "viewer": (),
+}
+ROLE_MASKS = {
+    role: bit | sum(ROLE_BITS[parent] for parent in ROLE_INHERITS[role])
+    for role, bit in ROLE_BITS.items()
+}
+
 # Hardcoded users as per requirements
 # In production, this would come from a database with hashed passwords
 USERS_DB = {
@@ -37,6 +68,10 @@ USERS_DB = {
     }
 }
 
+# Compared against when the username is unknown so that path costs the same
+# as a known user with a wrong password
+_DUMMY_PASSWORD = "\x00" * 32
+
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """
     Authenticate user with username and password.
@@ -44,9 +79,10 @@ def authenticate_user(username: str, password: str) -> Optional[dict]:
     """
     
     user = USERS_DB.get(username)
-    if not user:
-        return None
-    if user["password"] != password:
+    expected = user["password"] if user else _DUMMY_PASSWORD
+    # Constant-time comparison to avoid leaking password info via timing
+    password_ok = hmac.compare_digest(expected.encode(), password.encode())
+    if not user or not password_ok:
         return None
     return user
 
@@ -60,6 +96,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    if "role" in to_encode:
+        to_encode["role_mask"] = ROLE_MASKS.get(to_encode["role"], 0)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -68,8 +106,29 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     Verify JWT token and return payload.
     Raises HTTPException if token is invalid.
     """
+    token = credentials.credentials
+    
+    # Reject structurally invalid tokens (not header.payload.signature) before
+    # hashing or HMAC verification
+    if len(token) > MAX_TOKEN_LENGTH or token.count(".") != 2:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    cache_key = hashlib.sha256(token.encode()).digest()
+    
+    # Fast path: token already verified and not yet expired
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+        if cached is not None:
+            user, exp = cached
+            if exp > time.time():
+                return dict(user)
+            del _token_cache[cache_key]
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
@@ -81,7 +140,22 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        return {"username": username, "role": role}
+        # Tokens issued without role_mask fall back to the role lookup
+        role_mask = payload.get("role_mask")
+        if role_mask is None:
+            role_mask = ROLE_MASKS.get(role, 0)
+        
+        user = {"username": username, "role": role, "role_mask": role_mask}
+        
+        exp = payload.get("exp")
+        if exp is not None:
+            with _token_cache_lock:
+                # Drop oldest entries when the cache is full
+                while len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+                    del _token_cache[next(iter(_token_cache))]
+                _token_cache[cache_key] = (user, float(exp))
+        
+        return dict(user)
     
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -89,7 +163,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -101,8 +175,10 @@ def require_role(required_role: str):
     Dependency to require specific role.
     Usage: Depends(require_role("admin"))
     """
+    required_mask = ROLE_BITS[required_role]
+    
     def role_checker(current_user: dict = Depends(verify_token)) -> dict:
-        if current_user["role"] != required_role:
+        if not (current_user["role_mask"] & required_mask):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. Required role: {required_role}"
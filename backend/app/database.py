@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -25,17 +26,49 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 
+def get_sql_echo():
+    """
+    SQL query logging is off by default; enable with SQL_ECHO=1/true/yes
+    or SQL_ECHO=debug (also logs result rows) for profiling sessions.
+    """
+    value = os.getenv("SQL_ECHO", "").lower()
+    if value == "debug":
+        return "debug"
+    return value in ("1", "true", "yes")
+
+# Connection budget per process is split between the two engines and kept
+# well under PostgreSQL's default max_connections=100:
+# sync 5+5 (uploads, stats, single order) + async 20+10 (order list) = 40
+
 # Create engine with performance optimizations
 engine = create_engine(
     DATABASE_URL,
-    pool_size=20, # connection pool size
-    max_overflow=40, # additional connections if pool is full
+    pool_size=5, # connection pool size
+    max_overflow=5, # additional connections if pool is full
     pool_pre_ping=True, # check connections before using
-    echo=True # set to True for SQL query logging
+    pool_recycle=1800, # replace connections older than 30 minutes
+    echo=get_sql_echo() # SQL query logging, controlled by SQL_ECHO
+)
+
+# Async engine (asyncpg) for read endpoints; the sync engine is kept for
+# uploads, which rely on psycopg2's COPY support
+def get_async_database_url(url: str) -> str:
+    """Point a postgresql:// URL at the asyncpg driver"""
+    scheme, rest = url.split("://", 1)
+    return f"postgresql+asyncpg://{rest}" if scheme.startswith("postgresql") else url
+
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL),
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    echo=get_sql_echo()
 )
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -50,3 +83,11 @@ def get_db():
         yield db
     finally: 
         db.close()
+
+async def get_async_db():
+    """
+    Dependency function to get an async database session.
+    The session is closed when the request finishes.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from datetime import timedelta
 import logging
+import os
 
 from .database import engine, Base
 from .routers import upload, orders
@@ -15,14 +17,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema is managed by Alembic (`alembic upgrade head` runs before the server
+# starts in the container). APP_CREATE_TABLES=1 creates tables in-process for
+# local development without migrations.
+if os.getenv("APP_CREATE_TABLES") == "1":
+    Base.metadata.create_all(bind=engine)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Orders Management API",
     description="RESTful API for managing e-commerce orders with role-based access control",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes large order pages much faster
 )
 
 # Configure CORS for frontend communication
@@ -1,7 +1,17 @@
 from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from .database import Base
 
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    Convert an aware datetime to naive UTC, the form stored in Order.order_date.
+    Naive values are assumed to be UTC already and returned unchanged.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 class Order(Base):
     """
     Order model optimized handling millions of records.
@@ -37,6 +47,9 @@ class Order(Base):
         # For date range + status filtering with pagination
         Index('idx_order_date_status', 'order_date', 'status'),
         
+        # For keyset pagination on (order_date, id)
+        Index('idx_order_date_id', 'order_date', 'id'),
+        
         # For customer-specific queries
         Index('idx_customer_email_order_date', 'customer_email', 'order_date'),
     )
@@ -1,19 +1,72 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional
+from sqlalchemy import func, select, tuple_
+from typing import Optional, Tuple
 from datetime import datetime
+import base64
 import logging
-import math
+import time
 
-from ..database import get_db
-from ..models import Order
-from ..schemas import OrderResponse, PaginatedOrderResponse
+from ..database import get_async_db, get_db
+from ..models import Order, to_naive_utc
+from ..schemas import ALLOWED_STATUS, OrderResponse, PaginatedOrderResponse
 from ..auth import get_current_user
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 logger = logging.getLogger(__name__)
 
+# Stats change rarely on a sub-minute timescale; cache the result briefly
+STATS_CACHE_TTL = 30  # seconds
+_stats_cache: Optional[Tuple[dict, float]] = None  # (stats, expires_at)
+
+# Per-status counts computed in the same scan via COUNT(*) FILTER (WHERE ...).
+# Rows loaded before upload status validation may hold other values; they are
+# reported under "other" so by_status still adds up to total_orders.
+_STATUS_ORDER = tuple(sorted(ALLOWED_STATUS))
+_STATUS_COUNT_COLUMNS = tuple(
+    func.count().filter(Order.status == name).label(name) for name in _STATUS_ORDER
+) + (
+    func.count().filter(Order.status.notin_(_STATUS_ORDER)).label('other'),
+)
+_STATUS_KEYS = _STATUS_ORDER + ('other',)
+
+def _encode_cursor(order) -> str:
+    """Encode the (order_date, id) position of an order as an opaque cursor"""
+    raw = f"{order.order_date.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by _encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        order_date, order_pk = raw.split("|")
+        return to_naive_utc(datetime.fromisoformat(order_date)), int(order_pk)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _apply_filters(query, customer_email, status, start_date, end_date):
+    """Apply the shared order list filters to a Query or Select"""
+    if customer_email:
+        query = query.filter(Order.customer_email == customer_email)
+    
+    if status:
+        query = query.filter(Order.status == status.lower())
+    
+    if start_date:
+        query = query.filter(Order.order_date >= to_naive_utc(start_date))
+    
+    if end_date:
+        query = query.filter(Order.order_date <= to_naive_utc(end_date))
+    
+    return query
+
+async def _count_orders(db: AsyncSession, customer_email, status, start_date, end_date) -> int:
+    """Count orders matching the list filters with a plain SELECT count(id)"""
+    return await db.scalar(_apply_filters(
+        select(func.count(Order.id)), customer_email, status, start_date, end_date
+    ))
+
 @router.get("", response_model=PaginatedOrderResponse)
 async def get_orders(
     customer_email: Optional[str] = Query(None, description="Filter by customer email"),
@@ -22,8 +75,9 @@ async def get_orders(
     end_date: Optional[datetime] = Query(None, description="Filter orders before this date"),
     page: int = Query(1, ge=1, description="Page number (1-indexed)"),
     page_size: int = Query(50, ge=1, le=1000, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous response's next_cursor"),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get orders with filtering and pagination.
@@ -36,49 +90,60 @@ async def get_orders(
     - start_date: Orders on or after this date
     - end_date: Orders on or before this date
     
+    Pagination:
+    - cursor: Keyset pagination on (order_date, id); skips the COUNT query
+      and returns total/total_pages as null
+    - page: Offset pagination with exact total (for page-numbered UIs)
+    
     Performance optimizations:
     - Uses composite indexes for filtered queries
-    - Efficient COUNT query
-    - Proper offset/limit pagination
+    - Keyset pagination stays O(page_size) regardless of depth
+    - Selects plain column rows instead of materializing ORM objects
+    - Async asyncpg session, so queries don't tie up a worker thread
+    - Counts available separately via /api/orders/count
     """
     
     try:
-        # Build base query
-        query = db.query(Order)
-        
-        # Apply filters
-        if customer_email:
-            query = query.filter(Order.customer_email == customer_email)
-        
-        if status:
-            query = query.filter(Order.status == status.lower())
-        
-        if start_date:
-            query = query.filter(Order.order_date >= start_date)
+        # Build base query with filters; selecting the table returns plain
+        # rows, skipping ORM instance construction and identity-map bookkeeping
+        stmt = _apply_filters(select(Order.__table__), customer_email, status, start_date, end_date)
         
-        if end_date:
-            query = query.filter(Order.order_date <= end_date)
+        if cursor:
+            # Keyset pagination: continue after the last row of the previous page
+            cursor_date, cursor_id = _decode_cursor(cursor)
+            stmt = stmt.filter(tuple_(Order.order_date, Order.id) < (cursor_date, cursor_id))
+            total = None
+            total_pages = None
+            offset = 0
+        else:
+            # Get total count (optimized query)
+            total = await _count_orders(db, customer_email, status, start_date, end_date)
+            
+            # Calculate pagination
+            total_pages = (total + page_size - 1) // page_size
+            offset = (page - 1) * page_size
         
-        # Get total count (optimized query)
-        total = query.count()
+        # Get paginated results ordered by date (most recent first);
+        # fetch one extra row to know whether another page exists
+        stmt = stmt.order_by(Order.order_date.desc(), Order.id.desc()) \
+                   .offset(offset) \
+                   .limit(page_size + 1)
+        orders = (await db.execute(stmt)).all()
         
-        # Calculate pagination
-        total_pages = math.ceil(total / page_size) if total > 0 else 0
-        offset = (page - 1) * page_size
+        next_cursor = None
+        if len(orders) > page_size:
+            orders = orders[:page_size]
+            next_cursor = _encode_cursor(orders[-1])
         
-        # Get paginated results ordered by date (most recent first)
-        orders = query.order_by(Order.order_date.desc()) \
-                     .offset(offset) \
-                     .limit(page_size) \
-                     .all()
-        
-        logger.info(f"Retrieved {len(orders)} orders (page {page}/{total_pages})")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Retrieved %d orders (page %d/%s)", len(orders), page, total_pages)
         
         return PaginatedOrderResponse(
             total=total,
             page=page,
             page_size=page_size,
             total_pages=total_pages,
+            next_cursor=next_cursor,
             data=orders
         )
         
@@ -86,6 +151,24 @@ async def get_orders(
         logger.error(f"Error retrieving orders: {str(e)}")
         raise
 
+@router.get("/count")
+async def get_order_count(
+    customer_email: Optional[str] = Query(None, description="Filter by customer email"),
+    status: Optional[str] = Query(None, description="Filter by order status"),
+    start_date: Optional[datetime] = Query(None, description="Filter orders after this date"),
+    end_date: Optional[datetime] = Query(None, description="Filter orders before this date"),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get the number of orders matching the filters.
+    
+    Kept separate from the list endpoint so cursor-paginated clients only
+    pay for the COUNT query when they need it.
+    """
+    
+    return {"total": await _count_orders(db, customer_email, status, start_date, end_date)}
+
 @router.get("/stats")
 async def get_order_stats(
     current_user: dict = Depends(get_current_user),
@@ -98,26 +181,35 @@ async def get_order_stats(
     - Total orders
     - Total revenue
     - Orders by status
+    
+    Computed in one query and cached for STATS_CACHE_TTL seconds.
     """
     
+    global _stats_cache
+    
+    now = time.monotonic()
+    if _stats_cache is not None and _stats_cache[1] > now:
+        return _stats_cache[0]
+    
     try:
-        # Total orders and revenue
-        total_stats = db.query(
+        # Totals and per-status counts in a single scan
+        row = db.query(
             func.count(Order.id).label('total_orders'),
-            func.sum(Order.total_amount).label('total_revenue')
-        ).first()
-        
-        # Orders by status
-        status_counts = db.query(
-            Order.status,
-            func.count(Order.id).label('count')
-        ).group_by(Order.status).all()
+            func.sum(Order.total_amount).label('total_revenue'),
+            *_STATUS_COUNT_COLUMNS
+        ).one()
         
-        return {
-            "total_orders": total_stats.total_orders or 0,
-            "total_revenue": float(total_stats.total_revenue or 0),
-            "by_status": {status: count for status, count in status_counts}
+        stats = {
+            "total_orders": row.total_orders or 0,
+            "total_revenue": float(row.total_revenue or 0),
+            "by_status": {
+                status: count
+                for status, count in zip(_STATUS_KEYS, row[2:])
+                if count
+            }
         }
+        _stats_cache = (stats, now + STATS_CACHE_TTL)
+        return stats
         
     except Exception as e:
         logger.error(f"Error retrieving stats: {str(e)}")
@@ -134,7 +226,6 @@ async def get_order_by_id(
     order = db.query(Order).filter(Order.order_id == order_id).first()
     
     if not order:
-        from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Order not found")
     
     return order
\ No newline at end of file
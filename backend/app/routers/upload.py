@@ -1,176 +1,246 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy import func
+from sqlalchemy import text
+import anyio
+import ciso8601
+from contextlib import closing
 import csv
 import io
+import itertools
 from datetime import datetime
 from typing import List
 import logging
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
-from ..database import get_db
-from ..models import Order
-from ..schemas import UploadResponse
+from ..database import SessionLocal
+from ..models import Order, to_naive_utc
+from ..schemas import ALLOWED_STATUS, UploadResponse
 from ..auth import get_admin_user
 
 router = APIRouter(prefix="/api/upload", tags=["upload"])
 logger = logging.getLogger(__name__)
 
 # Constants for CSV processing
-BATCH_SIZE = 1000  # Insert records in batches for performance
+BATCH_SIZE = 1000  # Stage records with COPY in batches for performance
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB limit
 
-@router.post("/orders", response_model=UploadResponse)
-async def upload_orders_csv(
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_admin_user),
-    db: Session = Depends(get_db)
-):
+# Columns loaded from CSV (identity and audit columns are set by the database)
+COPY_COLUMNS = tuple(
+    c.name for c in Order.__table__.columns
+    if c.name not in ('id', 'created_at', 'updated_at')
+)
+
+# Columns overwritten when an order_id already exists (exclude immutable/identity fields)
+_UPSERT_UPDATE_COLS = tuple(name for name in COPY_COLUMNS if name != 'order_id')
+
+# Staging/merge SQL built once at import instead of per batch
+_COPY_COLUMN_LIST = ", ".join(COPY_COLUMNS)
+_CREATE_STAGING_SQL = text(
+    f"CREATE TEMP TABLE orders_stage ON COMMIT DROP AS "
+    f"SELECT {_COPY_COLUMN_LIST} FROM orders WITH NO DATA"
+)
+# Preserves file order so the last occurrence of an order_id wins
+_ADD_STAGE_SEQ_SQL = text("ALTER TABLE orders_stage ADD COLUMN stage_seq BIGSERIAL")
+_COPY_STAGE_SQL = f"COPY orders_stage ({_COPY_COLUMN_LIST}) FROM STDIN WITH (FORMAT csv)"
+_MERGE_SQL = text(
+    f"INSERT INTO orders ({_COPY_COLUMN_LIST}) "
+    f"SELECT DISTINCT ON (order_id) {_COPY_COLUMN_LIST} FROM orders_stage "
+    f"ORDER BY order_id, stage_seq DESC "
+    f"ON CONFLICT (order_id) DO UPDATE SET "
+    + ", ".join(f"{name} = EXCLUDED.{name}" for name in _UPSERT_UPDATE_COLS)
+    # Force updated_at to now() on updates
+    + ", updated_at = now()"
+)
+
+# Quoted fields may span lines, matching the csv module fallback
+ARROW_PARSE_OPTIONS = pacsv.ParseOptions(newlines_in_values=True)
+
+# Typed columns for Arrow's vectorized CSV parser
+ARROW_CONVERT_OPTIONS = pacsv.ConvertOptions(
+    column_types={
+        'order_id': pa.string(),
+        'customer_email': pa.string(),
+        'customer_name': pa.string(),
+        'product_name': pa.string(),
+        'quantity': pa.int32(),
+        'unit_price': pa.float64(),
+        'total_amount': pa.float64(),
+        'status': pa.string(),
+        'order_date': pa.timestamp('us'),
+    }
+)
+
+def _iter_csv_rows(fileobj):
     """
-    Upload CSV file with order data (Admin only).
-    
-    CSV Format:
-    order_id,customer_email,customer_name,product_name,quantity,unit_price,total_amount,status,order_date
-    
-    Performance optimizations:
-    - Streaming file reading to handle large files
-    - Batch inserts for efficiency
-    - Transaction management
-    - Validation before database operations
+    Yield CSV rows as dicts.
+    Streams Arrow record batches when possible and falls back to
+    csv.DictReader when Arrow rejects the file, so per-row errors are
+    still reported. Rows Arrow already yielded are skipped on fallback.
     """
+    rows_yielded = 0
+    try:
+        reader = pacsv.open_csv(
+            fileobj,
+            parse_options=ARROW_PARSE_OPTIONS,
+            convert_options=ARROW_CONVERT_OPTIONS,
+        )
+        for record_batch in reader:
+            for row in record_batch.to_pylist():
+                yield row
+                rows_yielded += 1
+        return
+    except pa.ArrowInvalid:
+        fileobj.seek(0)
     
-    # Validate file type
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+    # Decode lazily so rows are parsed as they are read; newline='' leaves
+    # line splitting to the csv module, as it expects
+    text_stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')  # Handle BOM
+    try:
+        yield from itertools.islice(csv.DictReader(text_stream), rows_yielded, None)
+    finally:
+        # Release the upload file without closing it
+        text_stream.detach()
+
+def _create_staging_table(db: Session) -> None:
+    """
+    Create a temp table shaped like the CSV columns of orders.
+    It is dropped automatically when the upload transaction commits.
+    """
+    db.execute(_CREATE_STAGING_SQL)
+    db.execute(_ADD_STAGE_SEQ_SQL)
+
+def _copy_batch(cursor, batch: List[dict]) -> None:
+    """Stream a batch of validated rows into orders_stage with COPY"""
+    buf = io.StringIO()
+    # Quote strings so empty values are not read back as NULL
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    for item in batch:
+        writer.writerow([item[name] for name in COPY_COLUMNS])
+    buf.seek(0)
     
-    # Read file content
+    cursor.copy_expert(_COPY_STAGE_SQL, buf)
+
+def _merge_staged_orders(db: Session) -> int:
+    """
+    Upsert staged rows into orders in a single statement.
+    Returns the number of orders inserted or updated.
+    """
+    result = db.execute(_MERGE_SQL)
+    return result.rowcount
+
+def _text(value) -> str:
+    """Strip a CSV text value, treating missing/null as empty"""
+    return value.strip() if isinstance(value, str) else ''
+
+def _to_datetime(value) -> datetime:
+    """
+    Accept datetimes already converted by Arrow or ISO strings.
+    Offsets are applied and dropped so COPY stores naive UTC, like the read filters.
+    """
+    if isinstance(value, datetime):
+        return to_naive_utc(value)
+    # C parser, much faster than datetime.fromisoformat; raises ValueError on bad input
+    return to_naive_utc(ciso8601.parse_datetime(_text(value)))
+
+def _process_csv_sync(fileobj, db_factory) -> UploadResponse:
+    """
+    Parse, validate and load an uploaded CSV.
+    Runs in a worker thread with its own session, so it may block on
+    parsing and PostgreSQL without stalling other requests.
+    """
+    db = db_factory()
     try:
-        content = await file.read()
-        
-        # Check file size
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"
-            )
-        
-        # Decode content
-        decoded_content = content.decode('utf-8-sig')  # Handle BOM
-        csv_reader = csv.DictReader(io.StringIO(decoded_content))
-        
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid file encoding. Please use UTF-8")
-    except Exception as e:
-        logger.error(f"Error reading file: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
+        return _load_orders(db, _iter_csv_rows(fileobj))
+    finally:
+        db.close()
+
+def _load_orders(db: Session, csv_reader) -> UploadResponse:
+    """Validate CSV rows, stage them with COPY and merge into orders"""
     
     # Process CSV
     records_processed = 0
     records_created = 0
     records_failed = 0
+    records_staged = 0
     errors = []
     batch = []
     
+    def flush_batch():
+        """COPY the current batch into staging; a failed batch is rolled back alone"""
+        nonlocal records_failed, records_staged, batch
+        try:
+            with db.begin_nested():
+                _copy_batch(copy_cursor, batch)
+            records_staged += len(batch)
+        except Exception as e:
+            records_failed += len(batch)
+            errors.append(f"Batch staging failed: {str(e)}")
+        batch = []
+    
     try:
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (header is row 1)
-            records_processed += 1
+        # One explicit transaction for the whole upload; the staging table drops on commit.
+        # A single DBAPI cursor with a fixed COPY statement is reused for every batch.
+        with db.begin(), closing(db.connection().connection.cursor()) as copy_cursor:
+            _create_staging_table(db)
             
-            try:
-                # Parse and validate row
-                order_data = {
-                    'order_id': row.get('order_id', '').strip(),
-                    'customer_email': row.get('customer_email', '').strip(),
-                    'customer_name': row.get('customer_name', '').strip(),
-                    'product_name': row.get('product_name', '').strip(),
-                    'quantity': int(row.get('quantity', 0)),
-                    'unit_price': float(row.get('unit_price', 0)),
-                    'total_amount': float(row.get('total_amount', 0)),
-                    'status': row.get('status', '').strip().lower(),
-                    'order_date': datetime.fromisoformat(row.get('order_date', '').strip())
-                }
+            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (header is row 1)
+                records_processed += 1
                 
-                # Basic validation
-                if not order_data['order_id']:
-                    raise ValueError("order_id is required")
-                if not order_data['customer_email']:
-                    raise ValueError("customer_email is required")
-                if order_data['quantity'] <= 0:
-                    raise ValueError("quantity must be positive")
-                if order_data['unit_price'] <= 0:
-                    raise ValueError("unit_price must be positive")
-                
-                batch.append(order_data)
-                
-                # Bulk insert when batch is full
-                if len(batch) >= BATCH_SIZE:
-                    try:
-                        # Deduplicate by order_id within the batch (last one wins)
-                        dedup_map = {item['order_id']: item for item in batch}
-                        dedup_batch = list(dedup_map.values())
-
-                        insert_stmt = pg_insert(Order).values(dedup_batch)
-                        # Prepare columns to update on conflict (exclude immutable/identity fields)
-                        update_cols = {
-                            c.name: getattr(insert_stmt.excluded, c.name)
-                            for c in Order.__table__.columns
-                            if c.name not in ('id', 'order_id', 'created_at', 'updated_at')
-                        }
-                        # Force updated_at to now() on updates
-                        update_cols['updated_at'] = func.now()
-
-                        upsert_stmt = insert_stmt.on_conflict_do_update(
-                            index_elements=[Order.__table__.c.order_id],
-                            set_=update_cols,
-                        )
-
-                        db.execute(upsert_stmt)
-                        db.commit()
-                        # Count as successfully upserted
-                        records_created += len(dedup_batch)
-                        batch = []
-                    except Exception as e:
-                        db.rollback()
-                        records_failed += len(batch)
-                        errors.append(f"Batch insert failed: {str(e)}")
-                        batch = []
-                        
-            except ValueError as e:
-                records_failed += 1
-                if len(errors) < 100:  # Limit error messages
-                    errors.append(f"Row {row_num}: {str(e)}")
-            except Exception as e:
-                records_failed += 1
-                if len(errors) < 100:
-                    errors.append(f"Row {row_num}: Unexpected error - {str(e)}")
-        
-        # Insert remaining batch
-        if batch:
-            try:
-                # Deduplicate by order_id within the remaining batch
-                dedup_map = {item['order_id']: item for item in batch}
-                dedup_batch = list(dedup_map.values())
-
-                insert_stmt = pg_insert(Order).values(dedup_batch)
-                update_cols = {
-                    c.name: getattr(insert_stmt.excluded, c.name)
-                    for c in Order.__table__.columns
-                    if c.name not in ('id', 'order_id', 'created_at', 'updated_at')
-                }
-                update_cols['updated_at'] = func.now()
-
-                upsert_stmt = insert_stmt.on_conflict_do_update(
-                    index_elements=[Order.__table__.c.order_id],
-                    set_=update_cols,
-                )
-
-                db.execute(upsert_stmt)
-                db.commit()
-                records_created += len(dedup_batch)
-            except Exception as e:
-                db.rollback()
-                records_failed += len(batch)
-                errors.append(f"Final batch insert failed: {str(e)}")
-        
+                try:
+                    # Parse and validate row
+                    order_data = {
+                        'order_id': _text(row.get('order_id')),
+                        'customer_email': _text(row.get('customer_email')),
+                        'customer_name': _text(row.get('customer_name')),
+                        'product_name': _text(row.get('product_name')),
+                        'quantity': int(row.get('quantity') or 0),
+                        'unit_price': float(row.get('unit_price') or 0),
+                        'total_amount': float(row.get('total_amount') or 0),
+                        'status': _text(row.get('status')).lower(),
+                        'order_date': _to_datetime(row.get('order_date'))
+                    }
+                    
+                    # Basic validation
+                    if not order_data['order_id']:
+                        raise ValueError("order_id is required")
+                    if not order_data['customer_email']:
+                        raise ValueError("customer_email is required")
+                    if order_data['quantity'] <= 0:
+                        raise ValueError("quantity must be positive")
+                    if order_data['unit_price'] <= 0:
+                        raise ValueError("unit_price must be positive")
+                    if order_data['status'] not in ALLOWED_STATUS:
+                        raise ValueError(f"invalid status {order_data['status']!r}")
+                    
+                    batch.append(order_data)
+                    
+                    # Stage rows when batch is full
+                    if len(batch) >= BATCH_SIZE:
+                        flush_batch()
+                            
+                except ValueError as e:
+                    records_failed += 1
+                    if len(errors) < 100:  # Limit error messages
+                        errors.append(f"Row {row_num}: {str(e)}")
+                except Exception as e:
+                    records_failed += 1
+                    if len(errors) < 100:
+                        errors.append(f"Row {row_num}: Unexpected error - {str(e)}")
+            
+            # Stage remaining batch
+            if batch:
+                flush_batch()
+            
+            # Merge staged rows into orders (duplicates within the file: last one wins)
+            if records_staged:
+                try:
+                    with db.begin_nested():
+                        records_created = _merge_staged_orders(db)
+                except Exception as e:
+                    records_failed += records_staged
+                    errors.append(f"Merge into orders failed: {str(e)}")
+            
         logger.info(f"CSV upload completed. Created: {records_created}, Failed: {records_failed}")
         
         return UploadResponse(
@@ -181,7 +251,50 @@ async def upload_orders_csv(
             errors=errors if errors else None
         )
         
+    except UnicodeDecodeError:
+        # Raised while streaming rows; the transaction was rolled back
+        raise HTTPException(status_code=400, detail="Invalid file encoding. Please use UTF-8")
     except Exception as e:
-        db.rollback()
         logger.error(f"Unexpected error during CSV processing: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+
+@router.post("/orders", response_model=UploadResponse)
+async def upload_orders_csv(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_admin_user)
+):
+    """
+    Upload CSV file with order data (Admin only).
+    
+    CSV Format:
+    order_id,customer_email,customer_name,product_name,quantity,unit_price,total_amount,status,order_date
+    
+    Performance optimizations:
+    - Streaming vectorized CSV parsing with Arrow (falls back to csv reader)
+    - Rows staged with PostgreSQL COPY and merged with a single upsert
+    - Single transaction for the whole upload
+    - Validation before database operations
+    - Parsing and loading run in a worker thread, keeping the event loop free
+    """
+    
+    # Validate file type
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV")
+    
+    # Check file size without loading it (upload is already spooled)
+    try:
+        file.file.seek(0, 2)
+        file_size = file.file.tell()
+        file.file.seek(0)
+    except Exception as e:
+        logger.error(f"Error reading file: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
+    
+    if file_size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"
+        )
+    
+    # Stream the spooled file into a worker thread with its own session
+    return await anyio.to_thread.run_sync(_process_csv_sync, file.file, SessionLocal)
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from datetime import datetime
 from typing import Optional, List
 
+# Allowed order statuses (module-level so validation doesn't rebuild it per row)
+ALLOWED_STATUS = frozenset({'pending', 'processing', 'shipped', 'delivered', 'cancelled'})
+_ALLOWED_STATUS_MESSAGE = f'Status must be one of: {", ".join(sorted(ALLOWED_STATUS))}'
+
 # Authentication Schemas
 class Token(BaseModel):
     access_token: str
@@ -29,10 +33,10 @@ class OrderBase(BaseModel):
     @classmethod
     def validate_status(cls, v):
         """Validate status is one of allowed values"""
-        allowed_status = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
-        if v.lower() not in allowed_status:
-            raise ValueError(f'Status must be one of: {", ".join(allowed_status)}')
-        return v.lower()    
+        v = v.lower()
+        if v not in ALLOWED_STATUS:
+            raise ValueError(_ALLOWED_STATUS_MESSAGE)
+        return v    
 
 class OrderCreate(OrderBase):
     """Schema for creating a new order"""
@@ -44,8 +48,7 @@ class OrderResponse(OrderBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
         
 # Pagination and filtering
 class OrderFilter(BaseModel):
@@ -59,10 +62,11 @@ class OrderFilter(BaseModel):
 
 class PaginatedOrderResponse(BaseModel):
     """Paginated response for orders"""
-    total: int
+    total: Optional[int] = None  # None when paginating by cursor
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
     data: List[OrderResponse]
     
 class UploadResponse(BaseModel):
@@ -197,6 +197,7 @@ class ApiService {
     if (params.end_date) queryParams.append('end_date', params.end_date);
     if (params.page) queryParams.append('page', params.page.toString());
     if (params.page_size) queryParams.append('page_size', params.page_size.toString());
+    if (params.cursor) queryParams.append('cursor', params.cursor);
 
     const queryString = queryParams.toString();
     const endpoint = `/api/orders${queryString ? '?' + queryString : ''}`;
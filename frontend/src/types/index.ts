@@ -32,6 +32,7 @@ export interface PaginatedResponse<T> {
   page: number;
   page_size: number;
   total_pages: number;
+  next_cursor?: string | null;
   data: T[];
 }
 
@@ -42,6 +43,7 @@ export interface OrderFilters {
   end_date?: string;
   page?: number;
   page_size?: number;
+  cursor?: string;
 }
 
 // Upload types